@@ -0,0 +1,143 @@
+"""Benchmark for the precomputed system prompt.
+
+Compares per-step request preparation at the baseline (system prompt rendered
+from a ChatPromptTemplate on every ReAct step) against the precomputed
+SystemMessage. The LLM is mocked, so the timings are the agent's own CPU cost
+per step. Tool schemas are not compared: the pinned langgraph already bound
+them once at graph build time before this change.
+
+Usage:
+    python evaluation/benchmark_prompt_prefix.py
+"""
+import asyncio
+import json
+import os
+import sys
+import textwrap
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# --- Production Imports ---
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    SystemMessagePromptTemplate,
+)
+from langgraph.prebuilt import create_react_agent
+
+from src.agent.device_tools import TOOL_SCHEMAS, tools
+from src.agent.llm import llm
+from src.agent.prompt import SYSTEM_MESSAGE, SYSTEM_PROMPT
+
+ITERATIONS = 2000
+AGENT_STEPS = 300
+
+# The baseline system prompt, verbatim (including its whitespace)
+BASELINE_SYSTEM_PROMPT = """
+    You are a **Certified Sleep Therapist and ResMed Device Support Agent**. Your primary goal is to 
+    help users troubleshoot their CPAP devices, check their usage compliance, and provide accurate, 
+    medically compliant information.
+
+    RULES:
+    1. **Prioritize Safety:** Do not recommend any changes to therapy pressure (settings) 
+       unless explicitly instructed by a doctor or in a clear troubleshooting step 
+       (e.g., pressure check).
+    2. **Use Data First:** Always use your tools to check **device usage data** 
+       (leak rate, compliance) before giving general advice, as the problem is 
+       often device-specific.
+    3. **Be Empathetic:** Maintain a professional, reassuring, and empathetic tone.
+    """
+
+# The per-step template the agent used before the prompt was precomputed
+LEGACY_PROMPT_TEMPLATE = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(BASELINE_SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name="messages", optional=True),
+    ]
+)
+
+# A short conversation, as seen on the second or third ReAct step
+CONVERSATION = [
+    HumanMessage(content="My AirSense 10 makes a clicking sound, can you help?"),
+    AIMessage(content="Let me check your device data first."),
+    HumanMessage(content="Sure, go ahead."),
+]
+
+
+def time_per_call(func, iterations: int = ITERATIONS) -> float:
+    """Returns the mean wall time of func in microseconds."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def request_prefixes(agent, conversations) -> list:
+    """Serialises the system message and tools of the request sent at each step.
+
+    The model call is intercepted and its input is passed through the chat
+    model's own request builder, so the prefix is what would go on the wire.
+    """
+    prefixes = []
+
+    async def capture(messages, *args, **kwargs):
+        payload = llm._get_request_payload(messages, **kwargs)  # pylint: disable=protected-access
+        prefixes.append(
+            json.dumps({"system": payload["messages"][0], "tools": payload.get("tools")}, sort_keys=True)
+        )
+        return AIMessage(content="Done.")
+
+    with patch('src.agent.llm.ChatOpenAI.ainvoke', side_effect=capture):
+        for conversation in conversations:
+            await agent.ainvoke({"messages": conversation})
+    return prefixes
+
+
+async def time_agent_step(agent) -> float:
+    """Mean latency of one agent node step with the LLM mocked out, in microseconds."""
+    inputs = {"messages": CONVERSATION}
+    with patch('src.agent.llm.ChatOpenAI.ainvoke', return_value=AIMessage(content="Done.")):
+        await agent.ainvoke(inputs)  # warm up
+        start = time.perf_counter()
+        for _ in range(AGENT_STEPS):
+            await agent.ainvoke(inputs)
+    return (time.perf_counter() - start) / AGENT_STEPS * 1e6
+
+
+async def main():
+    """Runs the micro and end-to-end benchmarks and prints a summary."""
+    print("--- Prompt Prefix Precomputation Benchmark ---")
+
+    legacy_agent = create_react_agent(model=llm, tools=tools, state_modifier=LEGACY_PROMPT_TEMPLATE)
+    agent = create_react_agent(
+        model=llm.bind_tools(TOOL_SCHEMAS), tools=tools, state_modifier=SYSTEM_MESSAGE
+    )
+
+    first_step, later_step = await request_prefixes(agent, [CONVERSATION[:1], CONVERSATION])
+    print(f"Request system+tools prefix byte-stable across steps: {first_step == later_step}")
+    print(f"System prompt byte-identical to baseline: {SYSTEM_PROMPT == BASELINE_SYSTEM_PROMPT}")
+    print(
+        "System prompt identical after dedent/strip: "
+        f"{SYSTEM_PROMPT == textwrap.dedent(BASELINE_SYSTEM_PROMPT).strip()}"
+    )
+
+    prompt_before = time_per_call(
+        lambda: LEGACY_PROMPT_TEMPLATE.invoke({"messages": CONVERSATION}).to_messages()
+    )
+    prompt_after = time_per_call(lambda: [SYSTEM_MESSAGE, *CONVERSATION])
+    print("\nSystem prompt render per step (microseconds):")
+    print(f"  Baseline template:      {prompt_before:9.1f}")
+    print(f"  Precomputed message:    {prompt_after:9.1f}")
+
+    step_before = await time_agent_step(legacy_agent)
+    step_after = await time_agent_step(agent)
+    print("\nAgent step latency with a mocked LLM (microseconds):")
+    print(f"  Baseline template:      {step_before:9.1f}")
+    print(f"  Precomputed prefix:     {step_after:9.1f}")
+    print(f"  Saved per step:         {step_before - step_after:9.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
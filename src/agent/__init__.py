@@ -2,6 +2,9 @@
 from dotenv import load_dotenv
 from traceloop.sdk import Traceloop
 
+from src.agent.logging_config import configure_logging
+
 load_dotenv()
+configure_logging()
 
 Traceloop.init(app_name="resmed-support-agent")
@@ -0,0 +1,176 @@
+"""Batch execution of many agent conversations for ResMed Support Agent.
+
+Usage:
+    python -m src.agent.batch items.jsonl --job-id nightly-checkin-2025-10-01 > results.ndjson
+
+Each input line is a JSON object with ``thread_id`` and ``user_input``. A job id
+names one run: reuse it only to resume that run, and pick a new one (e.g. with
+the date) for every new run.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.agent.graph import run_agent
+
+logger = logging.getLogger(__name__)
+
+_JOB_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class BatchItem(BaseModel):
+    """A single conversation turn in a batch."""
+    thread_id: str
+    user_input: str
+
+    def checkpoint_key(self) -> str:
+        """Identifies this exact turn: the thread plus a digest of its input."""
+        digest = hashlib.sha256(self.user_input.encode("utf-8")).hexdigest()
+        return f"{self.thread_id}:{digest}"
+
+
+class BatchCheckpoint:
+    """Append-only JSONL record of the items a batch job has finished."""
+
+    def __init__(self, directory: str, job_id: str):
+        self.path = Path(directory) / f"{job_id}.jsonl"
+
+    def completed(self) -> Dict[str, Dict[str, Any]]:
+        """Returns finished results keyed by BatchItem.checkpoint_key()."""
+        if not self.path.exists():
+            return {}
+        results = {}
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from an interrupted write; the item is rerun
+                    continue
+                results[entry["key"]] = entry["result"]
+        return results
+
+    def record(self, item: BatchItem, result: Dict[str, Any]) -> None:
+        """Appends a finished result for an item."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": item.checkpoint_key(), "result": result}) + "\n")
+
+
+def validate_batch(
+    items: List[BatchItem], job_id: Optional[str] = None, concurrency: int = 1
+) -> None:
+    """Rejects unsafe job ids, unusable concurrency and repeated thread ids.
+
+    Raises:
+        ValueError: If the job id is not a plain file name, concurrency is below 1
+            or a thread id repeats.
+    """
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1, got {concurrency}.")
+    if job_id is not None and not _JOB_ID.match(job_id):
+        raise ValueError(
+            f"Invalid job id '{job_id}'. Use up to 64 letters, digits, '.', '_' or '-'."
+        )
+    seen = set()
+    for item in items:
+        if item.thread_id in seen:
+            raise ValueError(f"Duplicate thread_id '{item.thread_id}' in batch.")
+        seen.add(item.thread_id)
+
+
+async def _run_item(
+    item: BatchItem, semaphore: asyncio.Semaphore
+) -> Tuple[BatchItem, Dict[str, Any]]:
+    async with semaphore:
+        try:
+            output = await run_agent(item.thread_id, item.user_input)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            logger.exception("batch item failed", extra={"fields": {"thread_id": item.thread_id}})
+            return item, {"thread_id": item.thread_id, "status": "error", "error": str(error)}
+    return item, {"thread_id": item.thread_id, "status": "ok", **output}
+
+
+async def run_batch(
+    items: List[BatchItem],
+    job_id: Optional[str] = None,
+    concurrency: int = 8,
+    checkpoint_dir: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Runs conversations with bounded concurrency, yielding results as they finish.
+
+    With a job_id, successful results are checkpointed and a rerun of the same
+    job yields them again (marked ``resumed``) instead of calling the agent.
+    Checkpoints match on thread id and input, so a changed prompt is rerun.
+    Failed items are not checkpointed, so a rerun retries them.
+    """
+    validate_batch(items, job_id, concurrency)
+    checkpoint = None
+    completed: Dict[str, Dict[str, Any]] = {}
+    if job_id:
+        checkpoint = BatchCheckpoint(
+            checkpoint_dir or os.getenv("BATCH_CHECKPOINT_DIR", ".batch_checkpoints"), job_id
+        )
+        completed = checkpoint.completed()
+
+    pending = []
+    for item in items:
+        if item.checkpoint_key() in completed:
+            yield {**completed[item.checkpoint_key()], "resumed": True}
+        else:
+            pending.append(item)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(_run_item(item, semaphore)) for item in pending]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item, result = await next_done
+            if checkpoint and result["status"] == "ok":
+                checkpoint.record(item, result)
+            yield result
+    finally:
+        # Stop outstanding work if the consumer goes away (e.g. client disconnect)
+        for task in tasks:
+            task.cancel()
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+async def _main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run many agent conversations as a batch.")
+    parser.add_argument("input", help="JSONL file of {thread_id, user_input} objects, or '-' for stdin")
+    parser.add_argument(
+        "--job-id",
+        help="Checkpoint progress under this id so the run can resume; use a new id per run",
+    )
+    parser.add_argument("--concurrency", type=_positive_int, default=8)
+    parser.add_argument("--checkpoint-dir")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    with source:
+        items = [BatchItem.model_validate_json(line) for line in source if line.strip()]
+
+    failures = 0
+    async for result in run_batch(items, args.job_id, args.concurrency, args.checkpoint_dir):
+        failures += result["status"] != "ok"
+        print(json.dumps(result), flush=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,121 @@
+"""Per-request step/token budgets and tool-loop detection for ResMed Support Agent."""
+import json
+import logging
+import os
+from collections import Counter
+from typing import Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from pydantic import BaseModel, Field
+
+from src.agent.tool_execution import is_timeout, normalize_args
+
+logger = logging.getLogger(__name__)
+
+# Reasons a turn can be cut short, reported in TurnUsage.abort_reason
+STEP_BUDGET = "step_budget"
+TOKEN_BUDGET = "token_budget"
+REPEATED_TOOL_CALL = "repeated_tool_call"
+TOOL_ERROR_LOOP = "tool_error_loop"
+
+
+class AgentBudget(BaseModel):
+    """Limits applied to a single agent request. Defaults come from the environment."""
+    max_steps: int = Field(default_factory=lambda: int(os.getenv("AGENT_MAX_STEPS", "6")))
+    max_tokens: int = Field(default_factory=lambda: int(os.getenv("AGENT_MAX_TOKENS", "12000")))
+    max_repeated_tool_calls: int = Field(
+        default_factory=lambda: int(os.getenv("AGENT_MAX_REPEATED_TOOL_CALLS", "2"))
+    )
+    max_failed_steps_per_tool: int = Field(
+        default_factory=lambda: int(os.getenv("AGENT_MAX_FAILED_STEPS_PER_TOOL", "2"))
+    )
+
+    @property
+    def recursion_limit(self) -> int:
+        """Graph recursion limit that backs up max_steps (one agent + one tools node per step)."""
+        return 2 * self.max_steps + 1
+
+
+class TurnUsage(BaseModel):
+    """Accounting for a single agent request."""
+    steps: int = 0
+    tool_calls: int = 0
+    tool_timeouts: int = 0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    abort_reason: Optional[str] = None
+
+
+class TurnMonitor:
+    """Tracks the messages produced during one request and decides when to stop early."""
+
+    def __init__(self, budget: AgentBudget):
+        self.budget = budget
+        self.usage = TurnUsage()
+        self._call_counts: Counter = Counter()
+        # Steps in which each tool returned an error, over the whole turn
+        self._failed_steps: Counter = Counter()
+        self._step_pending_results = 0
+        self._step_failed_tools: set = set()
+
+    def observe(self, message: BaseMessage) -> Optional[str]:
+        """Records a new message and returns an abort reason once a limit is hit."""
+        if isinstance(message, AIMessage):
+            self._step_pending_results = len(message.tool_calls)
+            self._step_failed_tools = set()
+            return self._observe_model_step(message)
+        if isinstance(message, ToolMessage) and self._step_pending_results:
+            self._step_pending_results -= 1
+            # A timeout is the budget running out, not a tool error
+            if is_timeout(message):
+                self.usage.tool_timeouts += 1
+            if message.status == "error":
+                self._step_failed_tools.add(message.name)
+            if self._step_pending_results:
+                return None
+            # Every call of the step has answered: each failing tool counts once
+            # per step, and successes of other tools in between do not reset it
+            for name in self._step_failed_tools:
+                self._failed_steps[name] += 1
+                if self._failed_steps[name] >= self.budget.max_failed_steps_per_tool:
+                    return self._abort(TOOL_ERROR_LOOP)
+        return None
+
+    def _observe_model_step(self, message: AIMessage) -> Optional[str]:
+        self.usage.steps += 1
+        if message.usage_metadata:
+            metadata = message.usage_metadata
+            input_tokens = metadata.get("input_tokens", 0)
+            cached = (metadata.get("input_token_details") or {}).get("cache_read") or 0
+            self.usage.input_tokens += input_tokens
+            self.usage.cached_input_tokens += cached
+            self.usage.output_tokens += metadata.get("output_tokens", 0)
+            self.usage.total_tokens += metadata.get("total_tokens", 0)
+            logger.info("llm call", extra={"fields": {
+                "step": self.usage.steps,
+                "input_tokens": input_tokens,
+                "cached_input_tokens": cached,
+                "uncached_input_tokens": input_tokens - cached,
+                "output_tokens": metadata.get("output_tokens", 0),
+            }})
+
+        if not message.tool_calls:
+            return None
+        self.usage.tool_calls += len(message.tool_calls)
+
+        for call in message.tool_calls:
+            key = (call["name"], json.dumps(normalize_args(call["args"]), sort_keys=True))
+            self._call_counts[key] += 1
+            if self._call_counts[key] > self.budget.max_repeated_tool_calls:
+                return self._abort(REPEATED_TOOL_CALL)
+        if self.usage.steps >= self.budget.max_steps:
+            return self._abort(STEP_BUDGET)
+        if self.usage.total_tokens >= self.budget.max_tokens:
+            return self._abort(TOKEN_BUDGET)
+        return None
+
+    def _abort(self, reason: str) -> str:
+        self.usage.abort_reason = reason
+        return reason
@@ -15,6 +15,11 @@ class DeviceData(BaseModel):
     """Simulates a user's cloud-connected device data."""
     device_metrics: List[DeviceMetrics]
 
+    @property
+    def data_version(self) -> int:
+        """Fingerprint of the current metrics; changes whenever any device data changes."""
+        return hash(self.model_dump_json())
+
     @task()
     async def get_all_device_models(self) -> list[str]:
         """Returns a list of all connected device model names."""
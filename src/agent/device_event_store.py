@@ -0,0 +1,295 @@
+"""Indexed store of device error and maintenance events for ResMed Support Agent."""
+import heapq
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+# Ordered from least to most severe; the position is the stored severity code
+SEVERITIES = ("NOTE", "WARNING", "FAULT")
+
+# First matching keyword group decides the event type
+EVENT_TYPE_KEYWORDS = (
+    ("motor", ("motor", "clicking", "blower")),
+    ("humidifier", ("humidifier", "water", "humidity")),
+    ("power", ("power", "restart", "voltage")),
+    ("mask", ("mask", "leak", "seal")),
+    ("filter", ("filter",)),
+    ("tubing", ("tubing", "hose", "climateline")),
+)
+
+_LOG_SECTION_HEADER = "ERROR AND MAINTENANCE LOGS"
+_DEVICE_MODEL_LINE = re.compile(r"^Device Model:\s*(?P<model>.+?)\s*$", re.MULTILINE)
+_EVENT_LINE = re.compile(
+    r"^\[(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2})\]\s+(?P<severity>[A-Z]+):\s*(?P<message>.+?)\s*$"
+)
+
+
+class DeviceEvent(BaseModel):
+    """A single logged error or maintenance event."""
+    device_model: str
+    timestamp: datetime
+    severity: str
+    event_type: str
+    message: str
+
+
+def classify_event(message: str) -> str:
+    """Derives a coarse event type from the event message."""
+    lowered = message.lower()
+    for event_type, keywords in EVENT_TYPE_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return event_type
+    return "general"
+
+
+def parse_device_log(text: str) -> List[DeviceEvent]:
+    """Extracts events from the ERROR AND MAINTENANCE LOGS section of a device export."""
+    model_match = _DEVICE_MODEL_LINE.search(text)
+    device_model = model_match.group("model") if model_match else "Unknown"
+    _, _, section = text.partition(_LOG_SECTION_HEADER)
+
+    events = []
+    for line in section.splitlines():
+        match = _EVENT_LINE.match(line.strip())
+        if not match or match.group("severity") not in SEVERITIES:
+            continue
+        events.append(
+            DeviceEvent(
+                device_model=device_model,
+                timestamp=datetime.strptime(match.group("ts"), "%Y-%m-%d %H:%M"),
+                severity=match.group("severity"),
+                event_type=classify_event(match.group("message")),
+                message=match.group("message"),
+            )
+        )
+    return events
+
+
+def _to_epoch(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+class _Interner:
+    """Maps repeated strings to small integer codes, case-insensitively by default."""
+
+    def __init__(self, fold_case: bool = True):
+        self.fold_case = fold_case
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def _key(self, value: str) -> str:
+        return value.lower() if self.fold_case else value
+
+    def intern(self, value: str) -> int:
+        key = self._key(value)
+        if key not in self.codes:
+            self.codes[key] = len(self.values)
+            self.values.append(value)
+        return self.codes[key]
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self.codes.get(self._key(value))
+
+
+class DeviceEventStore:
+    """Columnar event store with a time-sorted index per (device, severity, type) group.
+
+    Rows are appended to compact typed arrays in arrival order. Device names,
+    event types and messages are interned, so each row is a few integers and a
+    repeated log message is stored once. Each group keeps parallel arrays of
+    timestamps and row ids sorted by time, so a time window is one bisect per
+    group, and counts and recurring-issue summaries come from the group bounds
+    without visiting rows. Late events are inserted into their group
+    in place, so there is never a full rebuild.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc)):
+        self.clock = clock
+        self._timestamps = array("q")
+        self._devices = array("H")
+        self._severities = array("B")
+        self._types = array("H")
+        self._messages = array("I")
+        self._device_names = _Interner()
+        self._type_names = _Interner()
+        self._message_texts = _Interner(fold_case=False)
+        self._groups: Dict[Tuple[int, int, int], Tuple[array, array]] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def now(self) -> datetime:
+        """Reference time for relative windows such as "the last 30 days"."""
+        return self.clock()
+
+    def add_event(
+        self,
+        device_model: str,
+        timestamp: datetime,
+        severity: str,
+        message: str,
+        event_type: Optional[str] = None,
+    ) -> None:
+        """Adds an event and indexes it immediately.
+
+        Raises:
+            ValueError: If the severity is not one of SEVERITIES.
+        """
+        severity = severity.upper()
+        if severity not in SEVERITIES:
+            raise ValueError(
+                f"Unknown severity '{severity}'. Valid severities are: {', '.join(SEVERITIES)}"
+            )
+        epoch = _to_epoch(timestamp)
+        key = (
+            self._device_names.intern(device_model),
+            SEVERITIES.index(severity),
+            self._type_names.intern(event_type or classify_event(message)),
+        )
+        row_id = len(self._timestamps)
+        self._timestamps.append(epoch)
+        self._devices.append(key[0])
+        self._severities.append(key[1])
+        self._types.append(key[2])
+        self._messages.append(self._message_texts.intern(message))
+
+        times, rows = self._groups.setdefault(key, (array("q"), array("I")))
+        if not times or epoch >= times[-1]:
+            times.append(epoch)
+            rows.append(row_id)
+        else:
+            position = bisect_right(times, epoch)
+            times.insert(position, epoch)
+            rows.insert(position, row_id)
+        self.version += 1
+
+    def add_events(self, events: Iterable[DeviceEvent]) -> int:
+        """Adds parsed events and returns how many were added."""
+        count = 0
+        for event in events:
+            self.add_event(
+                event.device_model, event.timestamp, event.severity, event.message, event.event_type
+            )
+            count += 1
+        return count
+
+    def ingest_log(self, text: str) -> int:
+        """Parses a device export and adds its events."""
+        return self.add_events(parse_device_log(text))
+
+    def _windows(
+        self,
+        device_model: Optional[str],
+        severity: Optional[str],
+        event_type: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ) -> List[Tuple[Tuple[int, int, int], array, array, int, int]]:
+        """Returns (group, times, rows, low, high) for every non-empty matching group."""
+        device = severity_code = type_code = None
+        if device_model:
+            device = self._device_names.lookup(device_model)
+            if device is None:
+                return []
+        if severity:
+            if severity.upper() not in SEVERITIES:
+                return []
+            severity_code = SEVERITIES.index(severity.upper())
+        if event_type:
+            type_code = self._type_names.lookup(event_type)
+            if type_code is None:
+                return []
+
+        start_epoch = None if start is None else _to_epoch(start)
+        end_epoch = None if end is None else _to_epoch(end)
+        windows = []
+        for key, (times, rows) in self._groups.items():
+            if (
+                (device is not None and key[0] != device)
+                or (severity_code is not None and key[1] != severity_code)
+                or (type_code is not None and key[2] != type_code)
+            ):
+                continue
+            low = 0 if start_epoch is None else bisect_left(times, start_epoch)
+            high = len(times) if end_epoch is None else bisect_right(times, end_epoch)
+            if high > low:
+                windows.append((key, times, rows, low, high))
+        return windows
+
+    def _event(self, row: int) -> DeviceEvent:
+        return DeviceEvent(
+            device_model=self._device_names.values[self._devices[row]],
+            timestamp=datetime.fromtimestamp(self._timestamps[row], tz=timezone.utc),
+            severity=SEVERITIES[self._severities[row]],
+            event_type=self._type_names.values[self._types[row]],
+            message=self._message_texts.values[self._messages[row]],
+        )
+
+    def query(
+        self,
+        device_model: Optional[str] = None,
+        severity: Optional[str] = None,
+        event_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[DeviceEvent]:
+        """Returns matching events, most recent first. Unknown filter values match nothing."""
+        # Lazily merge each group's newest-first slice, stopping after `limit` rows
+        newest_first = []
+        for _, times, rows, low, high in self._windows(
+            device_model, severity, event_type, start, end
+        ):
+            first = low if limit is None else max(low, high - limit)
+            newest_first.append(zip(reversed(times[first:high]), reversed(rows[first:high])))
+        merged = heapq.merge(*newest_first, reverse=True)
+        return [self._event(row) for _, row in islice(merged, limit)]
+
+    def count(
+        self,
+        device_model: Optional[str] = None,
+        severity: Optional[str] = None,
+        event_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> int:
+        """Counts matching events from the group bounds alone."""
+        return sum(
+            high - low
+            for _, _, _, low, high in self._windows(device_model, severity, event_type, start, end)
+        )
+
+    def recurring(
+        self,
+        min_occurrences: int = 2,
+        device_model: Optional[str] = None,
+        severity: Optional[str] = None,
+        event_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[Dict[str, object]]:
+        """Summarises device/severity/type groups seen at least min_occurrences times."""
+        results = []
+        for (device, severity_code, type_code), times, _, low, high in self._windows(
+            device_model, severity, event_type, start, end
+        ):
+            if high - low < min_occurrences:
+                continue
+            results.append({
+                "device_model": self._device_names.values[device],
+                "severity": SEVERITIES[severity_code],
+                "event_type": self._type_names.values[type_code],
+                "count": high - low,
+                "first_seen": datetime.fromtimestamp(times[low], tz=timezone.utc),
+                "last_seen": datetime.fromtimestamp(times[high - 1], tz=timezone.utc),
+            })
+        results.sort(key=lambda group: group["count"], reverse=True)
+        return results
@@ -1,8 +1,12 @@
 """Device tools for ResMed Support Agent."""
-from langchain_core.tools import tool
+from datetime import datetime, timedelta, timezone
+
+from langchain_core.tools import ToolException, tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from traceloop.sdk.decorators import tool as traceloop_tool
 
 from src.agent.device_data_model import DeviceData, DeviceMetrics
+from src.agent.device_event_store import DeviceEvent, DeviceEventStore
 
 # Simulated live data for the user's devices
 USER_DEVICES = DeviceData(
@@ -22,6 +26,68 @@ USER_DEVICES = DeviceData(
     ]
 )
 
+# Simulated error and maintenance events exported by the user's devices. The
+# simulated store's clock is pinned to the export date so relative windows
+# ("last 30 days") line up with the sample data.
+SIMULATED_EXPORT_TIME = datetime(2025, 10, 1, tzinfo=timezone.utc)
+DEVICE_EVENTS = DeviceEventStore(clock=lambda: SIMULATED_EXPORT_TIME)
+DEVICE_EVENTS.add_events(
+    [
+        DeviceEvent(
+            device_model="AirSense 10",
+            timestamp=datetime(2025, 8, 19, 1, 5),
+            severity="WARNING",
+            event_type="humidifier",
+            message="Humidifier water level low."
+        ),
+        DeviceEvent(
+            device_model="AirSense 10",
+            timestamp=datetime(2025, 9, 12, 4, 30),
+            severity="WARNING",
+            event_type="humidifier",
+            message="Humidifier water level low."
+        ),
+        DeviceEvent(
+            device_model="AirSense 10",
+            timestamp=datetime(2025, 9, 27, 3, 15),
+            severity="WARNING",
+            event_type="humidifier",
+            message="Humidifier water level low."
+        ),
+        DeviceEvent(
+            device_model="AirSense 10",
+            timestamp=datetime(2025, 9, 28, 0, 0),
+            severity="NOTE",
+            event_type="power",
+            message="Power loss detected. Device restarted normally."
+        ),
+        DeviceEvent(
+            device_model="AirSense 10",
+            timestamp=datetime(2025, 9, 30, 2, 40),
+            severity="FAULT",
+            event_type="motor",
+            message="Loud clicking noise detected in motor assembly. User intervention required."
+        ),
+        DeviceEvent(
+            device_model="AirMini",
+            timestamp=datetime(2025, 9, 2, 23, 50),
+            severity="WARNING",
+            event_type="mask",
+            message="High mask leak detected for more than 30 minutes."
+        ),
+        DeviceEvent(
+            device_model="AirMini",
+            timestamp=datetime(2025, 9, 21, 0, 20),
+            severity="WARNING",
+            event_type="mask",
+            message="High mask leak detected for more than 30 minutes."
+        ),
+    ]
+)
+
+# Caps how many events a single tool answer lists
+MAX_EVENTS_PER_ANSWER = 20
+
 @tool
 @traceloop_tool()
 async def list_available_devices() -> str:
@@ -44,7 +110,10 @@ async def check_device_compliance(model_name: str) -> str:
         response += f" Recommendation: {compliance_data['recommendation']}"
         return response
     except ValueError as error:
-        return f"{error}"
+        raise ToolException(str(error)) from error
+
+# Unknown models surface as error results so repeated failures can be detected
+check_device_compliance.handle_tool_error = True
 
 @tool
 @traceloop_tool()
@@ -64,5 +133,63 @@ async def find_troubleshooting_manual(device_model: str, issue_keywords: str) ->
         "Try simplifying your query."
     )
 
+@tool
+@traceloop_tool()
+async def query_device_events(
+    device_model: str = "",
+    severity: str = "",
+    event_type: str = "",
+    days: int = 0,
+    recurring_only: bool = False,
+) -> str:
+    """
+    Looks up logged error and maintenance events for the user's devices.
+    Filter by device model, severity ('FAULT', 'WARNING' or 'NOTE'), event type
+    ('motor', 'humidifier', 'power', 'mask', 'filter', 'tubing' or 'general') and
+    the last N days (0 means all time).
+    Set recurring_only to list only issues that were logged more than once.
+    """
+    start = DEVICE_EVENTS.now() - timedelta(days=days) if days > 0 else None
+    filters = {
+        "device_model": device_model or None,
+        "severity": severity or None,
+        "event_type": event_type or None,
+        "start": start,
+    }
+    window = f" in the last {days} days" if start else ""
+
+    if recurring_only:
+        groups = DEVICE_EVENTS.recurring(**filters)
+        if not groups:
+            return f"No recurring events found{window}."
+        return "\n".join(
+            f"{group['device_model']} {group['severity']} ({group['event_type']}): "
+            f"{group['count']} times between {group['first_seen']:%Y-%m-%d} "
+            f"and {group['last_seen']:%Y-%m-%d}"
+            for group in groups
+        )
+
+    total = DEVICE_EVENTS.count(**filters)
+    if total == 0:
+        return f"No matching events found{window}."
+    events = DEVICE_EVENTS.query(**filters, limit=MAX_EVENTS_PER_ANSWER)
+    lines = [
+        f"[{event.timestamp:%Y-%m-%d %H:%M}] {event.device_model} {event.severity} "
+        f"({event.event_type}): {event.message}"
+        for event in events
+    ]
+    if total > len(events):
+        lines.append(f"...and {total - len(events)} older matching events.")
+    return "\n".join(lines)
+
+
+tools = [
+    list_available_devices,
+    check_device_compliance,
+    find_troubleshooting_manual,
+    query_device_events,
+]
 
-tools = [list_available_devices, check_device_compliance, find_troubleshooting_manual]
+# OpenAI tool definitions serialised once at startup, in a fixed order, so the
+# tools part of every request prefix is byte-identical
+TOOL_SCHEMAS = [convert_to_openai_tool(t) for t in tools]
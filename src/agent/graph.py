@@ -1,19 +1,45 @@
 """ResMed Support Agent - LangGraph implementation with ReAct agent."""
-from langchain_core.messages import AIMessage
+import logging
+import os
+from contextlib import aclosing
+from typing import Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from traceloop.sdk.decorators import task, workflow
 
-from src.agent.device_tools import tools
+from src.agent.budget import AgentBudget, TurnMonitor
+from src.agent.device_tools import DEVICE_EVENTS, TOOL_SCHEMAS, USER_DEVICES, tools
 from src.agent.llm import llm
-from src.agent.prompt import prompt_template
+from src.agent.prompt import SYSTEM_MESSAGE
+from src.agent.tool_execution import ToolResultCache, ToolTimeBudget, memoised_tools
+
+logger = logging.getLogger(__name__)
+
+ABORTED_TURN_RESPONSE = (
+    "I'm sorry, I wasn't able to finish looking into that. Could you rephrase your "
+    "question or tell me the exact device model (for example, 'AirSense 10')?"
+)
 
 # 1. Initialize State/Memory
 memory = MemorySaver()
 
-# 2. Compile the ReAct Agent
+# 2. Tool execution: concurrent within a step, memoised per thread, time-bounded per request
+TOOL_CACHE = ToolResultCache()
+agent_tools = memoised_tools(
+    tools,
+    cache=TOOL_CACHE,
+    version_fn=lambda: (USER_DEVICES.data_version, DEVICE_EVENTS.version),
+)
+TOOL_TURN_BUDGET_SECONDS = float(os.getenv("TOOL_TURN_BUDGET_SECONDS", "15"))
+
+# 3. Compile the ReAct Agent with the precomputed system prompt and tool schemas
 AGENT = create_react_agent(
-    model=llm, tools=tools, state_modifier=prompt_template, checkpointer=memory
+    model=llm.bind_tools(TOOL_SCHEMAS),
+    tools=agent_tools,
+    state_modifier=SYSTEM_MESSAGE,
+    checkpointer=memory,
 )
 
 
@@ -33,35 +59,95 @@ async def get_ai_response(events):
                         # Assuming a flat list of items for simplicity
                         return " ".join([str(item) for item in content])
                     return str(content)
-                except Exception as e:
-                    print(f"Error extracting response: {e}")
+                except Exception:
+                    logger.exception("Error extracting response")
                     return "An error occurred while processing the response."
 
     return None
 
 
-def print_event(event):
-    """Print debug information for agent events."""
+def log_event(event):
+    """Log the latest message of an agent event at DEBUG level.
+
+    The message object is handed to the queue-backed handler as-is; redaction,
+    truncation and JSON rendering happen on the logging thread.
+    """
     message = event.get("messages", [])
-    if message:
+    if message and logger.isEnabledFor(logging.DEBUG):
         if isinstance(message, list):
             message = message[-1]
-        message.pretty_print()
+        logger.debug("agent event", extra={"agent_message": message})
+
+
+async def close_aborted_turn(config) -> str:
+    """Answer any unanswered tool calls and append a final reply to the thread.
+
+    Keeps the checkpointed history valid for the next turn after a request was
+    stopped early.
+    """
+    state = await AGENT.aget_state(config)
+    messages = state.values.get("messages", [])
+    answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    pending = next(
+        (m.tool_calls for m in reversed(messages) if isinstance(m, AIMessage) and m.tool_calls),
+        [],
+    )
+    closing_messages = [
+        ToolMessage(
+            content="Skipped: the request was stopped early.",
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error",
+        )
+        for call in pending
+        if call["id"] not in answered
+    ]
+    closing_messages.append(AIMessage(content=ABORTED_TURN_RESPONSE))
+    await AGENT.aupdate_state(config, {"messages": closing_messages}, as_node="agent")
+    return ABORTED_TURN_RESPONSE
 
 
 @workflow(name="resmed-support-agent")
-async def run_agent(thread_id: str, user_input: str):
-    """Run the ResMed support agent with user input and return response."""
-    config = {"configurable": {"thread_id": thread_id}}
+async def run_agent(thread_id: str, user_input: str, budget: Optional[AgentBudget] = None):
+    """Run the ResMed support agent with user input and return response and usage."""
+    budget = budget or AgentBudget()
+    config = {
+        "configurable": {
+            "thread_id": thread_id,
+            # Only time spent running tools counts; model latency does not
+            "tool_budget": ToolTimeBudget(TOOL_TURN_BUDGET_SECONDS),
+        },
+        "recursion_limit": budget.recursion_limit,
+    }
     inputs = {"messages": [("user", user_input)]}
 
+    monitor = TurnMonitor(budget)
     events = []
-    # Async stream execution of the agent
-    async for event in AGENT.astream(inputs, config=config, stream_mode="values"):
-        print_event(event)
-        events.append(event)
+    seen = None
+    abort_reason = None
+    # Async stream execution of the agent, stopped early on budget or loop detection
+    async with aclosing(AGENT.astream(inputs, config=config, stream_mode="values")) as stream:
+        async for event in stream:
+            log_event(event)
+            events.append(event)
+            messages = event.get("messages", [])
+            if seen is None:
+                # The first event already holds the history plus this turn's input
+                seen = len(messages)
+            for message in messages[seen:]:
+                abort_reason = abort_reason or monitor.observe(message)
+            seen = len(messages)
+            if abort_reason:
+                break
 
-    response = await get_ai_response(events)
+    if abort_reason:
+        logger.warning("agent turn aborted", extra={"fields": {"reason": abort_reason}})
+        response = await close_aborted_turn(config)
+    else:
+        response = await get_ai_response(events)
     if response is None:
         response = "An internal error has occurred."
-    return {"response": response}
+
+    usage = monitor.usage.model_dump()
+    logger.info("agent turn finished", extra={"fields": {"usage": usage}})
+    return {"response": response, "usage": usage}
@@ -0,0 +1,133 @@
+"""Structured, queue-backed logging for ResMed Support Agent."""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+PACKAGE_LOGGER = "src.agent"
+
+# Patterns for patient-identifying fields that appear in pasted device exports
+_REDACTIONS = [
+    (re.compile(r"(?i)(\bpatient\s*id\b\s*[:#]?\s*)[A-Za-z0-9-]+"), r"\1[REDACTED]"),
+    (re.compile(r"(?i)(\b(?:serial\s*(?:number|no\.?)?|s/n)\s*[:#]\s*)[A-Za-z0-9-]+"), r"\1[REDACTED]"),
+    (re.compile(r"(?i)(\b(?:date\s*of\s*birth|d\.?o\.?b\b\.?)\s*[:#]?\s*)\S+"), r"\1[REDACTED]"),
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[REDACTED_EMAIL]"),
+    (re.compile(r"\(?\b\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}\b"), "[REDACTED_PHONE]"),
+]
+
+_listener: QueueListener | None = None
+
+
+def redact(text: str, max_chars: int) -> str:
+    """Masks PHI-bearing fields in text and truncates it to max_chars."""
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}... [truncated {len(text) - max_chars} chars]"
+    return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Renders records as single-line JSON with redacted, truncated payloads."""
+
+    def __init__(self, max_field_chars: int = 500):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def _clean(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return redact(value, self.max_field_chars)
+        if isinstance(value, dict):
+            return {key: self._clean(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._clean(item) for item in value]
+        return value
+
+    def _summarize_message(self, message) -> dict[str, Any]:
+        content = message.content
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str)
+        summary = {"type": message.type, "content": content}
+        if getattr(message, "name", None):
+            summary["name"] = message.name
+        if getattr(message, "tool_calls", None):
+            summary["tool_calls"] = [
+                {"name": call["name"], "args": call["args"]} for call in message.tool_calls
+            ]
+        if getattr(message, "status", None):
+            summary["status"] = message.status
+        return self._clean(summary)
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": self._clean(record.getMessage()),
+        }
+        agent_message = getattr(record, "agent_message", None)
+        if agent_message is not None:
+            payload["event"] = self._summarize_message(agent_message)
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(self._clean(fields))
+        if record.exc_info:
+            payload["exc"] = self._clean(self.formatException(record.exc_info))
+        return json.dumps(payload, default=str)
+
+
+class AgentEventSampler(logging.Filter):
+    """Keeps only a fraction of verbose agent-event records; other records pass."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "agent_message", None) is None:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Enqueues records unformatted so rendering happens on the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging() -> logging.Logger:
+    """Routes the package logger through a background queue listener (idempotent).
+
+    Reads LOG_LEVEL, LOG_MAX_FIELD_CHARS and AGENT_EVENT_SAMPLE_RATE from the environment.
+    """
+    global _listener  # pylint: disable=global-statement
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    if _listener is not None:
+        return logger
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        JsonFormatter(max_field_chars=int(os.getenv("LOG_MAX_FIELD_CHARS", "500")))
+    )
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(
+        AgentEventSampler(rate=float(os.getenv("AGENT_EVENT_SAMPLE_RATE", "1.0")))
+    )
+
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return logger
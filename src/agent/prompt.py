@@ -1,14 +1,10 @@
-"""Prompt template configuration for ResMed Support Agent."""
-from langchain_core.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
+"""Prompt configuration for ResMed Support Agent."""
+import textwrap
 
-prompt_template = ChatPromptTemplate.from_messages(
-    [
-        SystemMessagePromptTemplate.from_template(
-            """
+from langchain_core.messages import SystemMessage
+
+SYSTEM_PROMPT = textwrap.dedent(
+    """
     You are a **Certified Sleep Therapist and ResMed Device Support Agent**. Your primary goal is to 
     help users troubleshoot their CPAP devices, check their usage compliance, and provide accurate, 
     medically compliant information.
@@ -22,7 +18,8 @@ prompt_template = ChatPromptTemplate.from_messages(
        often device-specific.
     3. **Be Empathetic:** Maintain a professional, reassuring, and empathetic tone.
     """
-        ),
-        MessagesPlaceholder(variable_name="messages", optional=True),
-    ]
-)
+).strip()
+
+# Rendered once at import and prepended unchanged on every ReAct step, so the
+# prompt prefix stays byte-identical and the gateway's prompt cache can hit.
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
@@ -0,0 +1,190 @@
+"""Memoised, time-bounded tool execution for ResMed Support Agent."""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+logger = logging.getLogger(__name__)
+
+# Artifact of a tool result that was cut off by the request's tool time budget
+TOOL_TIMEOUT = "tool_timeout"
+
+
+def normalize_args(value: Any) -> Any:
+    """Case-folds and whitespace-collapses strings so equivalent arguments compare equal."""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {key: normalize_args(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_args(item) for item in value]
+    return value
+
+
+class ToolResultCache:
+    """Per-thread LRU memo of tool results keyed on tool name, arguments and data version."""
+
+    def __init__(self, max_threads: int = 1024, max_entries_per_thread: int = 64):
+        self.max_threads = max_threads
+        self.max_entries_per_thread = max_entries_per_thread
+        self._threads: OrderedDict[str, OrderedDict[tuple, Any]] = OrderedDict()
+
+    @staticmethod
+    def make_key(tool_name: str, args: dict, data_version: Hashable) -> tuple:
+        """Builds the memo key for a tool call against a given data version."""
+        return (tool_name, json.dumps(normalize_args(args), sort_keys=True), data_version)
+
+    def get(self, thread_id: str, key: tuple) -> Any:
+        """Returns the memoised result, or None on a miss."""
+        entries = self._threads.get(thread_id)
+        if entries is None or key not in entries:
+            return None
+        self._threads.move_to_end(thread_id)
+        entries.move_to_end(key)
+        return entries[key]
+
+    def put(self, thread_id: str, key: tuple, value: Any) -> None:
+        """Stores a result, evicting the least recently used entries and threads."""
+        entries = self._threads.setdefault(thread_id, OrderedDict())
+        self._threads.move_to_end(thread_id)
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries_per_thread:
+            entries.popitem(last=False)
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+
+    def clear(self, thread_id: Optional[str] = None) -> None:
+        """Drops the memo for one thread, or for every thread."""
+        if thread_id is None:
+            self._threads.clear()
+        else:
+            self._threads.pop(thread_id, None)
+
+
+class ToolTimeBudget:
+    """Wall-clock time one request may spend running tools.
+
+    Time is only charged while at least one tool call is running, so model
+    latency between steps does not use up the budget and parallel calls in a
+    step are not counted twice.
+    """
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self._spent = 0.0
+        self._running = 0
+        self._started = 0.0
+
+    def remaining(self) -> float:
+        """Seconds of tool time left for this request."""
+        spent = self._spent
+        if self._running:
+            spent += self.clock() - self._started
+        return max(self.seconds - spent, 0.0)
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        """Charges the time spent inside the block, once across concurrent calls."""
+        if not self._running:
+            self._started = self.clock()
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            if not self._running:
+                self._spent += self.clock() - self._started
+
+
+def is_timeout(message: ToolMessage) -> bool:
+    """Whether a tool result was cut off by the request's tool time budget."""
+    return message.artifact == TOOL_TIMEOUT
+
+
+def memoised_tool(
+    tool_: BaseTool, cache: ToolResultCache, version_fn: Callable[[], Hashable]
+) -> StructuredTool:
+    """Wraps a tool so repeated calls in a thread are served from the memo.
+
+    The wrapper keeps the tool's name, description and argument schema, so the
+    model sees the same definition. It reads two keys from the run config:
+    ``thread_id`` scopes the memo and ``tool_budget`` (a ToolTimeBudget) bounds
+    how long the request's tool calls may run in total. A call cut off by the
+    budget returns a result whose artifact is TOOL_TIMEOUT, so it can be told
+    apart from an error raised by the tool. Identical calls in flight at the
+    same time share one execution. Error and timed-out results are not memoised.
+    """
+    inflight: dict[tuple, asyncio.Future] = {}
+
+    async def _run(args: dict, config: RunnableConfig) -> Tuple[str, Optional[str]]:
+        call = {"type": "tool_call", "id": "memoised", "name": tool_.name, "args": args}
+        budget: Optional[ToolTimeBudget] = config.get("configurable", {}).get("tool_budget")
+        timeout = None if budget is None else budget.remaining()
+        try:
+            with budget.running() if budget else nullcontext():
+                result: ToolMessage = await asyncio.wait_for(tool_.ainvoke(call, config), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("tool call timed out", extra={"fields": {"tool": tool_.name}})
+            return (
+                f"Tool '{tool_.name}' did not finish within the time budget for this request.",
+                TOOL_TIMEOUT,
+            )
+        if result.status == "error":
+            raise ToolException(result.content)
+        return result.content, None
+
+    async def _acall(config: RunnableConfig, **kwargs: Any) -> Tuple[str, Optional[str]]:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id is None:
+            return await _run(kwargs, config)
+
+        key = cache.make_key(tool_.name, kwargs, version_fn())
+        cached = cache.get(thread_id, key)
+        if cached is not None:
+            logger.debug("tool memo hit", extra={"fields": {"tool": tool_.name}})
+            return cached, None
+
+        inflight_key = (thread_id, key)
+        if inflight_key in inflight:
+            return await asyncio.shield(inflight[inflight_key])
+
+        future = asyncio.get_running_loop().create_future()
+        inflight[inflight_key] = future
+        try:
+            content, artifact = await _run(kwargs, config)
+            if artifact is None:
+                cache.put(thread_id, key, content)
+            future.set_result((content, artifact))
+            return content, artifact
+        except BaseException as error:
+            future.set_exception(error)
+            # Mark retrieved so an unawaited failure is not reported by the loop
+            future.exception()
+            raise
+        finally:
+            del inflight[inflight_key]
+
+    return StructuredTool.from_function(
+        coroutine=_acall,
+        name=tool_.name,
+        description=tool_.description,
+        args_schema=tool_.args_schema,
+        response_format="content_and_artifact",
+        handle_tool_error=True,
+    )
+
+
+def memoised_tools(
+    tools: Sequence[BaseTool], cache: ToolResultCache, version_fn: Callable[[], Hashable]
+) -> List[StructuredTool]:
+    """Wraps every tool with memoised_tool, sharing one cache."""
+    return [memoised_tool(tool_, cache, version_fn) for tool_ in tools]
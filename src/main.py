@@ -1,14 +1,17 @@
 """FastAPI backend for ResMed Support Agent."""
+import json
 import os
 import sys
-from fastapi import FastAPI
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import the new run_agent function
+from src.agent.batch import BatchItem, run_batch, validate_batch
 from src.agent.graph import run_agent
 
 app = FastAPI(
@@ -45,3 +48,31 @@ async def run_agent_endpoint(user_input: UserInput):
     Receives user input and executes the ResMed agent to provide a response.
     """
     return await run_agent(user_input.thread_id, user_input.user_input)
+
+
+class BatchInput(BaseModel):
+    """Request model for a batch of agent conversations."""
+    items: List[BatchItem]
+    job_id: Optional[str] = None
+    concurrency: int = Field(default=8, ge=1, le=64)
+
+
+@app.post("/run_agent/batch")
+async def run_agent_batch_endpoint(batch_input: BatchInput):
+    """
+    Runs many conversations with bounded concurrency and streams each result as
+    an NDJSON line as soon as it finishes. Resubmitting with the same job_id
+    resumes an interrupted run; use a new job_id for every new run.
+    """
+    try:
+        validate_batch(batch_input.items, batch_input.job_id, batch_input.concurrency)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+
+    async def ndjson_lines():
+        async for result in run_batch(
+            batch_input.items, batch_input.job_id, batch_input.concurrency
+        ):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
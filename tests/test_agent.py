@@ -1,10 +1,26 @@
 """Unit and integration tests for ResMed Support Agent."""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from unittest.mock import patch
 import pytest
-from langchain_core.messages import AIMessage
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
 
-from src.agent.device_tools import USER_DEVICES
-from src.agent.graph import run_agent
+from src.agent.batch import BatchItem, run_batch
+from src.agent.budget import STEP_BUDGET, TOOL_ERROR_LOOP, AgentBudget, TurnMonitor
+from src.agent.device_data_model import DeviceData
+from src.agent.device_event_store import DeviceEventStore
+from src.agent.device_tools import USER_DEVICES, query_device_events
+from src.agent.graph import ABORTED_TURN_RESPONSE, run_agent
+from src.agent.logging_config import AgentEventSampler, JsonFormatter, redact
+from src.agent.tool_execution import ToolResultCache, ToolTimeBudget, is_timeout, memoised_tool
+from src.main import app
+
+SAMPLE_DEVICE_LOG = Path(__file__).resolve().parent.parent / "sample-device-log.txt"
 
 # --- Unit Tests for Tools (Testing Pure Python Methods) ---
 @pytest.mark.asyncio
@@ -38,6 +54,141 @@ async def test_get_metrics_by_model_raises_value_error():
         # Test the core retrieval method for the error
         await USER_DEVICES.get_metrics_by_model("DreamStation")
 
+@pytest.mark.asyncio
+async def test_query_device_events_reports_recent_faults():
+    """The event tool answers severity and time-window questions precisely."""
+    result = await query_device_events.ainvoke({"severity": "fault", "days": 30})
+    assert "AirSense 10 FAULT (motor)" in result
+    assert "WARNING" not in result
+
+    recurring = await query_device_events.ainvoke({"severity": "WARNING", "recurring_only": True})
+    assert "AirSense 10 WARNING (humidifier): 3 times" in recurring
+    assert "AirMini WARNING (mask): 2 times" in recurring
+
+# --- Unit Tests for the Device Event Store ---
+
+def test_event_store_indexes_parsed_device_log():
+    """Events parsed from a device export are queryable by severity, type and time."""
+    with open(SAMPLE_DEVICE_LOG, encoding="utf-8") as f:
+        store = DeviceEventStore()
+        assert store.ingest_log(f.read()) == 3
+
+    faults = store.query(device_model="airsense 10", severity="FAULT")
+    assert [event.event_type for event in faults] == ["motor"]
+    assert store.count(event_type="humidifier") == 1
+    assert store.count(start=datetime(2025, 9, 28), end=datetime(2025, 9, 29)) == 1
+    assert store.query(device_model="DreamStation") == []
+
+def test_event_store_handles_out_of_order_events():
+    """Late-arriving older events are merged back into time order."""
+    store = DeviceEventStore()
+    store.add_event("AirMini", datetime(2025, 9, 10), "WARNING", "High mask leak.")
+    assert store.count() == 1
+    store.add_event("AirMini", datetime(2025, 9, 1), "WARNING", "High mask leak.")
+
+    events = store.query(device_model="AirMini")
+    assert [event.timestamp.day for event in events] == [10, 1]
+    assert [event.message for event in events] == ["High mask leak.", "High mask leak."]
+    assert store.recurring()[0]["count"] == 2
+    with pytest.raises(ValueError, match="Unknown severity"):
+        store.add_event("AirMini", datetime(2025, 9, 1), "CRITICAL", "Overheat.")
+
+def test_event_store_windows_use_the_store_clock():
+    """Relative windows are measured from the store's clock, not from the newest event."""
+    now = datetime(2025, 10, 1, tzinfo=timezone.utc)
+    store = DeviceEventStore(clock=lambda: now)
+    store.add_event("AirMini", datetime(2025, 8, 1), "WARNING", "High mask leak.")
+    store.add_event("AirSense 10", datetime(2025, 9, 25), "FAULT", "Motor clicking.")
+    store.add_event("AirSense 10", datetime(2025, 12, 1), "NOTE", "Power loss detected.")
+
+    start = store.now() - timedelta(days=30)
+    assert store.count(device_model="AirMini", start=start, end=now) == 0
+    assert store.count(device_model="AirSense 10", start=start, end=now) == 1
+
+# --- Unit Tests for Structured Logging ---
+
+def _agent_event_record(message):
+    record = logging.LogRecord("src.agent.graph", logging.DEBUG, __file__, 0, "agent event", None, None)
+    record.agent_message = message
+    return record
+
+def test_json_formatter_redacts_and_truncates_agent_events():
+    """Pasted device logs are masked and capped before they are written."""
+    with open(SAMPLE_DEVICE_LOG, encoding="utf-8") as f:
+        pasted_log = f.read()
+    formatter = JsonFormatter(max_field_chars=120)
+
+    line = formatter.format(_agent_event_record(HumanMessage(content=pasted_log)))
+    payload = json.loads(line)
+
+    assert payload["event"]["type"] == "human"
+    assert "87B4C9D2" not in line
+    assert "Patient ID: [REDACTED]" in payload["event"]["content"]
+    assert "[truncated" in payload["event"]["content"]
+    assert redact("Serial No: 2345-ABCD", 120) == "Serial No: [REDACTED]"
+    # Ordinary prose that merely contains the field names is left alone
+    prose = "The tool schemas are serialised once; Adobe exports a patient identifier."
+    assert redact(prose, 120) == prose
+
+def test_agent_event_sampler_only_drops_agent_events():
+    """A zero sample rate silences agent events but keeps ordinary records."""
+    sampler = AgentEventSampler(rate=0.0)
+    plain = logging.LogRecord("src.agent.graph", logging.INFO, __file__, 0, "done", None, None)
+
+    assert sampler.filter(_agent_event_record(AIMessage(content="hi"))) is False
+    assert sampler.filter(plain) is True
+
+# --- Unit Tests for Tool Memoisation ---
+
+def test_tool_result_cache_normalises_args_and_tracks_data_version():
+    """Equivalent arguments share an entry; a new data version misses."""
+    cache = ToolResultCache()
+    key = cache.make_key("check_device_compliance", {"model_name": "AirSense 10"}, 1)
+    cache.put("thread-a", key, "COMPLIANT")
+
+    same_call = cache.make_key("check_device_compliance", {"model_name": " airsense  10"}, 1)
+    assert cache.get("thread-a", same_call) == "COMPLIANT"
+    assert cache.get("thread-b", same_call) is None
+
+    changed_data = cache.make_key("check_device_compliance", {"model_name": "AirSense 10"}, 2)
+    assert cache.get("thread-a", changed_data) is None
+
+@pytest.mark.asyncio
+async def test_memoised_tool_times_out_when_tool_budget_runs_out():
+    """A tool still running when the request's tool time runs out is reported as a timeout."""
+    @tool
+    async def slow_lookup(model_name: str) -> str:
+        """Looks something up slowly."""
+        await asyncio.sleep(5)
+        return model_name
+
+    wrapped = memoised_tool(slow_lookup, ToolResultCache(), version_fn=lambda: 1)
+    result = await wrapped.ainvoke(
+        {"type": "tool_call", "id": "call_1", "name": "slow_lookup", "args": {"model_name": "AirMini"}},
+        {"configurable": {"thread_id": "timeout_test", "tool_budget": ToolTimeBudget(0.05)}},
+    )
+
+    assert is_timeout(result)
+    assert result.status == "success"
+    assert "did not finish within the time budget" in result.content
+
+# --- Unit Tests for Prompt Prefix and Token Accounting ---
+
+def test_turn_monitor_reports_cached_prompt_tokens():
+    """Cache hits reported by the gateway are accounted separately from uncached input."""
+    monitor = TurnMonitor(AgentBudget())
+    monitor.observe(AIMessage(
+        content="Done.",
+        usage_metadata={
+            "input_tokens": 1200, "output_tokens": 40, "total_tokens": 1240,
+            "input_token_details": {"cache_read": 1024},
+        },
+    ))
+
+    assert monitor.usage.input_tokens == 1200
+    assert monitor.usage.cached_input_tokens == 1024
+    assert monitor.usage.total_tokens == 1240
+
 # --- Integration Test: Full Agent Orchestration Flow (with Assertions) ---
 
 @pytest.mark.asyncio
@@ -90,3 +241,210 @@ async def test_agent_uses_compliance_tool(mock_llm_acall):
 
     # Verify the LLM was called exactly twice
     assert mock_llm_acall.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch('src.agent.llm.ChatOpenAI.ainvoke')
+async def test_agent_memoises_repeated_tool_calls(mock_llm_acall):
+    """Parallel calls in one step each run once; a repeat in a later step hits the memo."""
+    parallel_calls = AIMessage(
+        content="",
+        tool_calls=[
+            {'id': 'call_1', 'name': 'check_device_compliance', 'args': {'model_name': 'AirSense 10'}},
+            {'id': 'call_2', 'name': 'check_device_compliance', 'args': {'model_name': 'AirMini'}},
+        ]
+    )
+    repeated_call = AIMessage(
+        content="",
+        tool_calls=[
+            {'id': 'call_3', 'name': 'check_device_compliance', 'args': {'model_name': 'airsense 10'}},
+        ]
+    )
+    final_answer = AIMessage(content="Your AirSense 10 is compliant; your AirMini is not.")
+    mock_llm_acall.side_effect = [parallel_calls, repeated_call, final_answer]
+
+    with patch.object(
+        DeviceData, "check_compliance", autospec=True, side_effect=DeviceData.check_compliance
+    ) as spy:
+        response = await run_agent(thread_id="memo_test_1", user_input="Check both my devices.")
+
+    assert response['response'].startswith("Your AirSense 10 is compliant")
+    assert spy.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch('src.agent.llm.ChatOpenAI.ainvoke')
+async def test_agent_aborts_tool_error_loop(mock_llm_acall):
+    """Repeated failing tool calls end the turn with a graceful answer and usable history."""
+    def failing_call(call_id):
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {'id': call_id, 'name': 'check_device_compliance', 'args': {'model_name': 'DreamStation'}}
+            ]
+        )
+
+    mock_llm_acall.side_effect = [failing_call('call_1'), failing_call('call_2')]
+    response = await run_agent(thread_id="loop_test_1", user_input="Check my DreamStation.")
+
+    assert response['response'] == ABORTED_TURN_RESPONSE
+    assert response['usage']['abort_reason'] == TOOL_ERROR_LOOP
+    assert response['usage']['steps'] == 2
+    assert mock_llm_acall.call_count == 2
+
+    # The aborted turn left a valid history, so the thread keeps working
+    mock_llm_acall.side_effect = [AIMessage(content="Your AirSense 10 is compliant.")]
+    follow_up = await run_agent(thread_id="loop_test_1", user_input="What about my AirSense 10?")
+    assert follow_up['response'] == "Your AirSense 10 is compliant."
+    assert follow_up['usage']['abort_reason'] is None
+
+
+@pytest.mark.asyncio
+@patch('src.agent.llm.ChatOpenAI.ainvoke')
+async def test_agent_aborts_error_loop_interleaved_with_successes(mock_llm_acall):
+    """Successful calls to another tool in between do not hide a tool that keeps failing."""
+    def step(call_id, name, args):
+        return AIMessage(content="", tool_calls=[{'id': call_id, 'name': name, 'args': args}])
+
+    mock_llm_acall.side_effect = [
+        step(f'call_{i}', 'list_available_devices', {}) if i % 2 == 0 else
+        step(f'call_{i}', 'check_device_compliance', {'model_name': f'Dream{" " * (i // 2)}Station'})
+        for i in range(10)
+    ]
+    response = await run_agent(
+        thread_id="interleaved_loop_1",
+        user_input="Check my DreamStation.",
+        budget=AgentBudget(max_steps=10, max_repeated_tool_calls=5),
+    )
+
+    assert response['usage']['abort_reason'] == TOOL_ERROR_LOOP
+    assert response['usage']['steps'] == 4
+
+@pytest.mark.asyncio
+@patch('src.agent.llm.ChatOpenAI.ainvoke')
+async def test_agent_answers_after_one_step_of_parallel_failures(mock_llm_acall):
+    """Two failing calls in a single step are one failed step, not an error loop."""
+    mock_llm_acall.side_effect = [
+        AIMessage(content="", tool_calls=[
+            {'id': 'call_1', 'name': 'check_device_compliance', 'args': {'model_name': 'AirSense 11'}},
+            {'id': 'call_2', 'name': 'check_device_compliance', 'args': {'model_name': 'Air Mini 2'}},
+        ]),
+        AIMessage(content="Those aren't your devices; you have an AirSense 10 and an AirMini."),
+    ]
+    response = await run_agent(thread_id="parallel_failures_1", user_input="Check my devices.")
+
+    assert response['response'].startswith("Those aren't your devices")
+    assert response['usage']['abort_reason'] is None
+    assert response['usage']['steps'] == 2
+
+@pytest.mark.asyncio
+@patch('src.agent.graph.TOOL_TURN_BUDGET_SECONDS', 0.3)
+@patch('src.agent.llm.ChatOpenAI.ainvoke')
+async def test_slow_model_does_not_use_up_tool_time(mock_llm_acall):
+    """Model latency is not charged to the tool time budget."""
+    replies = iter([
+        AIMessage(content="", tool_calls=[
+            {'id': 'call_1', 'name': 'check_device_compliance', 'args': {'model_name': 'AirSense 10'}}
+        ]),
+        AIMessage(content="", tool_calls=[
+            {'id': 'call_2', 'name': 'check_device_compliance', 'args': {'model_name': 'AirMini'}}
+        ]),
+        AIMessage(content="Your AirSense 10 is compliant; your AirMini is not."),
+    ])
+
+    async def slow_model(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        return next(replies)
+
+    mock_llm_acall.side_effect = slow_model
+    response = await run_agent(thread_id="slow_model_1", user_input="Check both my devices.")
+
+    assert response['response'].startswith("Your AirSense 10 is compliant")
+    assert response['usage']['abort_reason'] is None
+    assert response['usage']['tool_timeouts'] == 0
+
+@pytest.mark.asyncio
+@patch('src.agent.llm.ChatOpenAI.ainvoke')
+async def test_agent_respects_step_budget(mock_llm_acall):
+    """A model that keeps asking for tools is stopped at the per-request step budget."""
+    mock_llm_acall.side_effect = [
+        AIMessage(content="", tool_calls=[{'id': 'call_1', 'name': 'list_available_devices', 'args': {}}]),
+        AIMessage(content="", tool_calls=[
+            {'id': 'call_2', 'name': 'check_device_compliance', 'args': {'model_name': 'AirMini'}}
+        ]),
+    ]
+    response = await run_agent(
+        thread_id="budget_test_1", user_input="Check everything.", budget=AgentBudget(max_steps=2)
+    )
+
+    assert response['usage']['abort_reason'] == STEP_BUDGET
+    assert response['usage']['tool_calls'] == 2
+    assert response['response'] == ABORTED_TURN_RESPONSE
+
+# --- Batch Execution Tests ---
+
+@pytest.mark.asyncio
+async def test_run_batch_bounds_concurrency_and_resumes(tmp_path):
+    """Only `concurrency` items run at once, and a rerun of the job skips finished items."""
+    running = 0
+    peak = 0
+
+    async def fake_run_agent(thread_id, user_input):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if thread_id == "patient-3":
+            raise RuntimeError("gateway timeout")
+        return {"response": f"checked {user_input}", "usage": {}}
+
+    items = [
+        BatchItem(thread_id=f"patient-{i}", user_input=f"Check my compliance for device {i}")
+        for i in range(6)
+    ]
+    with patch("src.agent.batch.run_agent", side_effect=fake_run_agent) as mock_run:
+        first = [r async for r in run_batch(items, "nightly", 2, str(tmp_path))]
+        assert peak == 2
+        assert sorted(r["status"] for r in first) == ["error"] + ["ok"] * 5
+
+        mock_run.side_effect = None
+        mock_run.return_value = {"response": "checked again", "usage": {}}
+        second = [r async for r in run_batch(items, "nightly", 2, str(tmp_path))]
+
+    assert sum(r.get("resumed", False) for r in second) == 5
+    assert mock_run.call_count == 7  # six first-run items plus the retried failure
+
+@pytest.mark.asyncio
+async def test_run_batch_reruns_items_whose_input_changed(tmp_path):
+    """A checkpoint only replays a thread's result when the input is identical."""
+    with patch("src.agent.batch.run_agent", return_value={"response": "ok", "usage": {}}) as mock_run:
+        items = [BatchItem(thread_id="patient-1", user_input="Check my AirSense 10")]
+        _ = [r async for r in run_batch(items, "job", 1, str(tmp_path))]
+
+        changed = [BatchItem(thread_id="patient-1", user_input="Check my AirMini")]
+        rerun = [r async for r in run_batch(changed, "job", 1, str(tmp_path))]
+
+    assert mock_run.call_count == 2
+    assert "resumed" not in rerun[0]
+
+@pytest.mark.asyncio
+async def test_run_batch_rejects_non_positive_concurrency():
+    """A concurrency below one would never run anything, so it is refused."""
+    items = [BatchItem(thread_id="patient-1", user_input="hi")]
+    with pytest.raises(ValueError, match="at least 1"):
+        _ = [r async for r in run_batch(items, concurrency=0)]
+
+def test_batch_endpoint_streams_ndjson_and_rejects_duplicates():
+    """The batch endpoint streams one JSON line per item and validates input up front."""
+    client = TestClient(app)
+    items = [{"thread_id": "a", "user_input": "hi"}, {"thread_id": "b", "user_input": "hi"}]
+
+    with patch("src.agent.batch.run_agent", return_value={"response": "hello", "usage": {}}):
+        response = client.post("/run_agent/batch", json={"items": items})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert sorted(line["thread_id"] for line in lines) == ["a", "b"]
+
+    duplicate = client.post("/run_agent/batch", json={"items": [items[0], items[0]]})
+    assert duplicate.status_code == 400